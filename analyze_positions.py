@@ -2,34 +2,80 @@
 """
 Analyse la distribution des positions dans les données d'entraînement
 pour comprendre pourquoi le policy network ne bouge pas.
+Usage: python3 analyze_positions.py [self_play.log]
 """
 
+import re
 import sys
-from collections import Counter
-import math
+
+import numpy as np
+
+NUM_POSITIONS = 19
+# Whitespace is bounded so that a match never exceeds MAX_CARRY bytes
+POSITION_TOKEN = b'POSITION_SELECTED:'
+POSITION_RE = re.compile(re.escape(POSITION_TOKEN) + rb'\s{0,32}(\d{1,2})\b')
+CHUNK_SIZE = 1 << 20
+MAX_CARRY = 64
 
 def analyze_self_play_logs(log_file):
     """
-    Parse les logs de self-play pour extraire quelles positions
-    sont sélectionnées par MCTS.
+    Parse les logs de self-play pour compter combien de fois chaque
+    position est sélectionnée par MCTS (lignes "POSITION_SELECTED: <n>").
+
+    Le fichier est lu par blocs de 1 MiB; seuls les derniers octets de
+    chaque bloc (au plus 2 * MAX_CARRY) sont reportés sur le bloc suivant,
+    quelle que soit la longueur des lignes.
+
+    Retourne un tableau de NUM_POSITIONS compteurs (index = position).
     """
-    positions_selected = []
+    positions_selected = np.zeros(NUM_POSITIONS, dtype=np.int64)
+    carry = b''
+
+    with open(log_file, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buf = carry + chunk
+            # Cut MAX_CARRY bytes before the end, moved back to the start of
+            # any POSITION_SELECTED token just before it, so that no match
+            # straddles the cut; the rest is scanned with the next chunk.
+            # Scanning up to cut + 1 lets \b see the real byte at the cut.
+            cut = max(len(buf) - MAX_CARRY, 0)
+            token = buf.rfind(POSITION_TOKEN, max(cut - MAX_CARRY, 0),
+                              cut + len(POSITION_TOKEN) - 1)
+            if token != -1:
+                cut = token
+            carry = buf[cut:]
+            positions_selected += count_positions(POSITION_RE.findall(buf, 0, cut + 1))
 
-    with open(log_file, 'r') as f:
-        for line in f:
-            # Cette ligne est un placeholder - il faudrait parser les vrais logs
-            # pour extraire les positions sélectionnées par MCTS
-            pass
+    positions_selected += count_positions(POSITION_RE.findall(carry))
 
     return positions_selected
 
+def count_positions(matches):
+    """Compte les positions (chaînes d'octets) avec np.bincount."""
+    if not matches:
+        return 0
+    positions = np.array(matches).astype(np.int64)
+    positions = positions[positions < NUM_POSITIONS]
+    return np.bincount(positions, minlength=NUM_POSITIONS)
+
 def main():
     print("🔍 Analyse de la Distribution des Positions")
     print("=" * 60)
 
-    # Pour l'instant, simulons une vérification simple
-    # En pratique, il faudrait parser les données de self-play
+    if len(sys.argv) > 1:
+        counts = analyze_self_play_logs(sys.argv[1])
+        total = counts.sum()
+        print(f"\n{total} positions sélectionnées dans {sys.argv[1]}")
+        if total:
+            top5 = np.argpartition(-counts, 5)[:5]
+            top5 = top5[np.argsort(-counts[top5], kind='stable')]
+            for pos in top5[counts[top5] > 0]:
+                print(f"  Position {pos:2d}: {counts[pos]:6d} ({100 * counts[pos] / total:5.1f}%)")
 
+    # Diagnostic général, affiché avec ou sans fichier de logs
     print("\n❓ Question clé: Pourquoi policy_loss = 2.9444 constant?")
     print("\nPolicy loss = 2.9444 = ln(19) signifie:")
     print("  → Le réseau prédit une distribution UNIFORME (1/19 pour chaque position)")
@@ -1,91 +1,207 @@
 #!/usr/bin/env python3
-"""Convert game-based expert data to flat training format."""
+"""Convert game-based expert data to flat training format.
+
+The output is an uncompressed .npz archive holding three packed arrays:
+``states`` (float32, one flattened tensor per move), ``policy`` (int16,
+best position) and ``value`` (float32, normalized final score).
+"""
 
 import json
+import multiprocessing
+import os
 import sys
+import tempfile
+import zipfile
+from itertools import islice
+
+import numpy as np
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 4 blocks (board, current tile, available, turn) of 19 positions x 3 values
+TENSOR_SIZE = 4 * 19 * 3
+
+# Games handed to the worker pool at a time, so the stream stays bounded
+BATCH_GAMES = 4096
 
 def tile_to_int(tile):
     """Convert tile dict to integer representation."""
     return tile['value1'] * 100 + tile['value2'] * 10 + tile['value3']
 
-def plateau_to_tensor(plateau_before, tile, turn, total_turns=19):
-    """Convert plateau state to 8-channel tensor (flattened)."""
+# The 27 Take It Easy tiles: vertical band 1/5/9, left diagonal 2/6/7,
+# right diagonal 3/4/8
+ALL_TILES = [
+    {'value1': v1, 'value2': v2, 'value3': v3}
+    for v1 in (1, 5, 9) for v2 in (2, 6, 7) for v3 in (3, 4, 8)
+]
+EMPTY_INDEX = len(ALL_TILES)
+
+# (v1, v2, v3) / 10 for each tile, plus a final all-zero row for empty slots
+TILE_LUT = np.zeros((EMPTY_INDEX + 1, 3), dtype=np.float32)
+TILE_LUT[:EMPTY_INDEX] = [[t['value1'], t['value2'], t['value3']] for t in ALL_TILES]
+TILE_LUT /= 10.0
+
+# Dense tile integer (0..999) -> TILE_LUT row; integers that are not a
+# tile map to -1 and are rejected. Empty slots (-1) are mapped separately.
+TILE_INDEX = np.full(1000, -1, dtype=np.int8)
+TILE_INDEX[[tile_to_int(t) for t in ALL_TILES]] = np.arange(EMPTY_INDEX)
+
+def plateau_to_tensor(plateau_before, tile, turn, total_turns=19, out=None):
+    """Convert plateau state to 8-channel tensor (flattened).
+
+    If ``out`` is given (a float32 array of TENSOR_SIZE values), the
+    tensor is written into it in place instead of a new array.
+    """
     # This is a simplified version - in reality we'd need to match
     # the exact tensor_conversion logic from Rust
     # For now, create a basic representation
-    
+    if out is None:
+        out = np.empty(TENSOR_SIZE, dtype=np.float32)
+    channels = out.reshape(4, 19, 3)
+
+    arr = np.asarray(plateau_before, dtype=np.intp)
+    if ((arr < -1) | (arr > 999)).any():
+        raise ValueError(f"Unknown tile in plateau: {plateau_before}")
+    empty = arr == -1
+    idx = np.where(empty, EMPTY_INDEX, TILE_INDEX[arr])
+    if (idx < 0).any():
+        raise ValueError(f"Unknown tile in plateau: {plateau_before}")
+
     # Channel 0-2: Board state (3 values per tile)
-    tensor = []
-    for pos in plateau_before:
-        if pos == -1:
-            tensor.extend([0.0, 0.0, 0.0])
-        else:
-            v1 = (pos // 100) / 10.0
-            v2 = ((pos % 100) // 10) / 10.0
-            v3 = (pos % 10) / 10.0
-            tensor.extend([v1, v2, v3])
-    
-    # Channel 3: Current tile
-    for _ in range(19):
-        tensor.extend([
-            tile['value1'] / 10.0,
-            tile['value2'] / 10.0,
-            tile['value3'] / 10.0
-        ])
-    
+    np.take(TILE_LUT, idx, axis=0, out=channels[0])
+
+    # Channel 3: Current tile, broadcast to every position
+    channels[1] = (tile['value1'] / 10.0, tile['value2'] / 10.0, tile['value3'] / 10.0)
+
     # Channel 4: Available positions
-    for pos in plateau_before:
-        tensor.extend([1.0 if pos == -1 else 0.0] * 3)
-    
+    channels[2] = empty[:, None]
+
     # Channel 5-7: Turn info (simplified)
-    turn_val = turn / total_turns
-    for _ in range(19):
-        tensor.extend([turn_val, turn_val, turn_val])
-    
-    return tensor
+    channels[3] = turn / total_turns
+
+    return out
+
+def iter_games(input_file):
+    """Yield games one at a time from a JSON array file.
+
+    Uses ijson when available so only one game is held in memory;
+    otherwise falls back to parsing the whole file at once, with orjson
+    if installed and the stdlib json module if not.
+    """
+    if ijson is None:
+        with open(input_file, 'rb') as f:
+            data = f.read()
+        loads = orjson.loads if orjson is not None else json.loads
+        yield from loads(data)
+        return
+
+    with open(input_file, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+def convert_one_game(game):
+    """Convert one game to its (states, policy, value) arrays."""
+    moves = game['moves']
+    final_score = game['final_score']
+    # Normalize score to [-1, 1]
+    normalized_score = ((final_score / 200.0) * 2.0) - 1.0
+    normalized_score = max(-1.0, min(1.0, normalized_score))
+
+    states = np.empty((len(moves), TENSOR_SIZE), dtype=np.float32)
+    policy = np.empty(len(moves), dtype=np.int16)
+    for i, move in enumerate(moves):
+        # Create training example for this move
+        plateau_to_tensor(
+            move['plateau_before'],
+            move['tile'],
+            move['turn'],
+            out=states[i]
+        )
+        policy[i] = move['best_position']
+    value = np.full(len(moves), normalized_score, dtype=np.float32)
+
+    return states, policy, value
+
+def iter_batches(iterable, size):
+    """Yield successive lists of at most ``size`` items."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
 
 def convert_games_to_flat_format(input_file, output_file):
-    """Convert game-based format to flat training examples."""
-    print(f"Loading {input_file}...")
-    with open(input_file, 'r') as f:
-        games = json.load(f)
-    
-    print(f"Converting {len(games)} games...")
-    examples = []
-    
-    for game in games:
-        final_score = game['final_score']
-        # Normalize score to [-1, 1]
-        normalized_score = ((final_score / 200.0) * 2.0) - 1.0
-        normalized_score = max(-1.0, min(1.0, normalized_score))
-        
-        for move in game['moves']:
-            # Create training example for this move
-            state_tensor = plateau_to_tensor(
-                move['plateau_before'],
-                move['tile'],
-                move['turn']
+    """Convert game-based format to flat training examples (.npz)."""
+    print(f"Counting moves in {input_file}...")
+    n_games = 0
+    n_examples = 0
+    for game in iter_games(input_file):
+        n_games += 1
+        n_examples += len(game['moves'])
+
+    print(f"Converting {n_games} games ({n_examples} moves)...")
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+        # Arrays are backed by .npy files on disk and filled as games are
+        # converted, so memory use does not grow with the dataset size.
+        arrays = {
+            name: np.lib.format.open_memmap(
+                os.path.join(tmp_dir, f"{name}.npy"), mode='w+',
+                dtype=dtype, shape=shape
             )
-            
-            example = {
-                'state': state_tensor,
-                'policy_target': move['best_position'],
-                'value_target': normalized_score
-            }
-            examples.append(example)
-    
-    print(f"Generated {len(examples)} training examples")
-    print(f"Saving to {output_file}...")
-    
-    with open(output_file, 'w') as f:
-        json.dump(examples, f)
-    
-    print(f"✅ Saved {len(examples)} examples to {output_file}")
-    print(f"   Examples per game: {len(examples) / len(games):.1f}")
+            for name, dtype, shape in (
+                ('states', np.float32, (n_examples, TENSOR_SIZE)),
+                ('policy', np.int16, (n_examples,)),
+                ('value', np.float32, (n_examples,)),
+            )
+        }
+
+        i = 0
+        with multiprocessing.Pool() as pool:
+            for batch in iter_batches(iter_games(input_file), BATCH_GAMES):
+                for game_states, game_policy, game_value in pool.imap(
+                    convert_one_game, batch, chunksize=64
+                ):
+                    j = i + len(game_policy)
+                    arrays['states'][i:j] = game_states
+                    arrays['policy'][i:j] = game_policy
+                    arrays['value'][i:j] = game_value
+                    i = j
+
+        # Flush and unmap every array before zipping, so no mapping is
+        # still open when the temporary directory is removed (Windows
+        # refuses to delete mapped files).
+        paths = {}
+        for name in list(arrays):
+            array = arrays.pop(name)
+            array.flush()
+            paths[name] = array.filename
+            mapping = array._mmap
+            del array
+            if mapping is not None:
+                mapping.close()
+
+        print(f"Saving to {output_file}...")
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_STORED,
+                             allowZip64=True) as out:
+            for name, path in paths.items():
+                out.write(path, arcname=f"{name}.npy")
+
+    print(f"✅ Saved {n_examples} examples from {n_games} games to {output_file}")
+    if n_games:
+        print(f"   Examples per game: {n_examples / n_games:.1f}")
 
 if __name__ == '__main__':
     if len(sys.argv) != 3:
-        print("Usage: python3 convert_expert_data.py <input.json> <output.json>")
+        print("Usage: python3 convert_expert_data.py <input.json> <output.npz>")
         sys.exit(1)
     
     convert_games_to_flat_format(sys.argv[1], sys.argv[2])
@@ -4,136 +4,239 @@ Analyse des résultats d'entraînement Take It Easy
 Usage: python3 scripts/analyze_results.py [data_file.csv]
 """
 
-import csv
+import fnmatch
+import os
 import sys
-import statistics
-from collections import defaultdict
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import polars as pl
+
+NUM_POSITIONS = 19
+
+# Board position names, indexed by position
+HEX_NAMES = (
+    "top-L", "top-M", "top-R",
+    "r2-1", "r2-2", "r2-3", "r2-4",
+    "r3-1", "r3-2", "CENTER", "r3-4", "r3-5",
+    "r4-1", "r4-2", "r4-3", "r4-4",
+    "bot-L", "bot-M", "bot-R",
+)
+
+# Percentage bars, indexed by bar length
+_BARS = tuple("█" * i for i in range(101))
+
+# Parquet key-value metadata entry recording the CSV a cache was built from.
+# Bump _CACHE_FORMAT whenever load_training_data's output columns or the
+# game_id encoding change, so caches written by older code are rejected.
+_CACHE_SOURCE_KEY = 'source_csv_stat'
+_CACHE_FORMAT = 'v1'
+
 def load_arena_results(path):
-    """Load arena results CSV."""
-    scores_a, scores_b = [], []
-    with open(path, 'r') as f:
-        reader = csv.reader(f)
-        next(reader)  # skip header
-        for row in reader:
-            if len(row) >= 3:
-                try:
-                    scores_a.append(int(row[1]))
-                    scores_b.append(int(row[2]))
-                except ValueError:
-                    pass
-    return scores_a, scores_b
+    """Load arena results CSV as two int arrays of scores.
+
+    Rows whose score columns are missing or not integers are skipped.
+    """
+    df = pl.read_csv(path, columns=[1, 2], infer_schema=False,
+                     truncate_ragged_lines=True)
+    df = df.select(
+        pl.all().str.strip_chars().cast(pl.Int64, strict=False)
+    ).drop_nulls()
+    return df[:, 0].to_numpy(), df[:, 1].to_numpy()
+
+def _csv_stamp(path):
+    """Tag a CSV version (exact mtime in ns and size) with the cache format."""
+    st = os.stat(path)
+    return f"{_CACHE_FORMAT}:{st.st_mtime_ns}:{st.st_size}"
+
+def _read_training_cache(cache, stamp):
+    """Return the cached moves frame if it was built from ``stamp``, else None."""
+    try:
+        if pl.read_parquet_metadata(cache).get(_CACHE_SOURCE_KEY) != stamp:
+            return None
+        return pl.read_parquet(cache)
+    except (pl.exceptions.PolarsError, OSError):
+        return None  # missing, truncated or unreadable cache: re-parse
+
+def _write_training_cache(moves, cache, stamp):
+    """Atomically write the cache: temp file in the same dir, then os.replace."""
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=cache.parent, prefix=f".{cache.name}.",
+                                   suffix='.tmp')
+        os.close(fd)
+        moves.write_parquet(tmp, metadata={_CACHE_SOURCE_KEY: stamp})
+        os.replace(tmp, cache)
+    except (pl.exceptions.PolarsError, OSError):
+        pass  # read-only data dir or full disk: just skip the cache
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
 
 def load_training_data(path):
-    """Load training data CSV."""
-    games = defaultdict(lambda: {"moves": [], "score": 0})
-    with open(path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            gid = row.get('game_id', '0')
-            games[gid]["score"] = int(row.get('final_score', 0))
-            games[gid]["moves"].append({
-                "turn": int(row.get('turn', 0)),
-                "pos": int(row.get('position', 0)),
-                "tile": (
-                    int(row.get('tile_0', 0)),
-                    int(row.get('tile_1', 0)),
-                    int(row.get('tile_2', 0))
-                )
-            })
-    return games
-
-def analyze_score_distribution(scores):
-    """Analyze score distribution."""
+    """Load training data CSV.
+
+    Returns ``(moves, scores, game_ids)``: ``moves`` has one row per move
+    with columns game_id, turn, position, tile_0, tile_1, tile_2;
+    ``scores`` and ``game_ids`` are aligned arrays with one entry per game.
+    Game ids are dictionary-encoded: ``game_id`` holds integer codes.
+
+    The parsed CSV is cached in a sibling .parquet file tagged with the
+    cache format version and the CSV's mtime and size; it is only reused
+    when all three match exactly.
+    """
+    path = Path(path)
+    cache = path.with_suffix('.parquet')
+    stamp = _csv_stamp(path)
+    moves = _read_training_cache(cache, stamp)
+    if moves is None:
+        moves = pl.scan_csv(path, schema_overrides={
+            'game_id': pl.Categorical,
+            'turn': pl.Int32,
+            'position': pl.Int32,
+            'final_score': pl.Int32,
+            'tile_0': pl.Int32,
+            'tile_1': pl.Int32,
+            'tile_2': pl.Int32,
+        }).with_columns(
+            pl.col('game_id').to_physical()
+        ).collect(engine='streaming')
+        # Only cache if the CSV was not rewritten while we parsed it
+        if _csv_stamp(path) == stamp:
+            _write_training_cache(moves, cache, stamp)
+    games = moves.group_by('game_id', maintain_order=True).agg(
+        pl.col('final_score').first()
+    )
+    return (
+        moves.drop('final_score'),
+        games['final_score'].to_numpy(),
+        games['game_id'].to_numpy(),
+    )
+
+def find_latest(data_dir, pattern):
+    """Return the most recently modified file in data_dir matching pattern."""
+    best, best_mtime = None, -1
+    try:
+        with os.scandir(data_dir) as it:
+            for entry in it:
+                if entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    mtime = entry.stat().st_mtime
+                    if mtime > best_mtime:
+                        best, best_mtime = entry.path, mtime
+    except FileNotFoundError:
+        pass
+    return best
+
+def count_positions(moves):
+    """Count how many moves were played on each position."""
+    return np.bincount(moves['position'].to_numpy(), minlength=NUM_POSITIONS)
+
+def top_positions(counts, k):
+    """Return the k most frequent (position, count) pairs, skipping zeros."""
+    order = np.argsort(-counts, kind='stable')[:k]
+    return [(int(pos), int(counts[pos])) for pos in order if counts[pos]]
+
+def compute_score_distribution(scores):
+    """Compute score statistics for analyze_score_distribution."""
+    arr = np.asarray(scores, dtype=np.int64)
+    n = arr.size
+    q_idx = [n//4, n//2, 3*n//4]
+    thresholds = np.array([150, 130, 120, 110, 100])
+    return {
+        'n': n,
+        'mean': float(arr.mean()),
+        'std': float(arr.std(ddof=1)) if n > 1 else 0,
+        'min': arr.min(),
+        'max': arr.max(),
+        'quartiles': np.partition(arr, q_idx)[q_idx],
+        'thresholds': thresholds,
+        'counts': (arr[None, :] >= thresholds[:, None]).sum(axis=1),
+    }
+
+def analyze_score_distribution(stats):
+    """Print the score distribution computed by compute_score_distribution."""
     print("\n📊 DISTRIBUTION DES SCORES")
     print("-" * 50)
 
-    mean = statistics.mean(scores)
-    std = statistics.stdev(scores) if len(scores) > 1 else 0
+    mean, std = stats['mean'], stats['std']
     print(f"Moyenne: {mean:.1f} ± {std:.1f} pts")
-    print(f"Min/Max: [{min(scores)}, {max(scores)}]")
+    print(f"Min/Max: [{stats['min']}, {stats['max']}]")
 
-    scores_sorted = sorted(scores)
-    n = len(scores_sorted)
-    q1, q2, q3 = scores_sorted[n//4], scores_sorted[n//2], scores_sorted[3*n//4]
+    q1, q2, q3 = stats['quartiles']
     print(f"Quartiles: Q1={q1}, Q2={q2}, Q3={q3}")
 
     print("\nDistribution par seuil:")
-    for threshold in [150, 130, 120, 110, 100]:
-        count = len([s for s in scores if s >= threshold])
-        pct = 100 * count / len(scores)
-        bar = "█" * int(pct / 5)
-        print(f"  >= {threshold}: {count:4d} ({pct:5.1f}%) {bar}")
+    rows = []
+    for threshold, count in zip(stats['thresholds'], stats['counts']):
+        pct = 100 * count / stats['n']
+        bar = _BARS[min(int(pct / 5), 100)]
+        rows.append(f"  >= {threshold}: {count:4d} ({pct:5.1f}%) {bar}")
+    sys.stdout.write("\n".join(rows) + "\n")
 
     return mean, std
 
-def analyze_positions(games):
-    """Analyze position preferences."""
+def compute_positions(moves):
+    """Count early-game (turns 0-3) positions."""
+    return count_positions(moves.filter(pl.col('turn') <= 3))
+
+def analyze_positions(early_positions):
+    """Print the position preferences computed by compute_positions."""
     print("\n📊 POSITIONS PRÉFÉRÉES")
     print("-" * 50)
 
-    hex_names = {
-        0: "top-L", 1: "top-M", 2: "top-R",
-        3: "r2-1", 4: "r2-2", 5: "r2-3", 6: "r2-4",
-        7: "r3-1", 8: "r3-2", 9: "CENTER", 10: "r3-4", 11: "r3-5",
-        12: "r4-1", 13: "r4-2", 14: "r4-3", 15: "r4-4",
-        16: "bot-L", 17: "bot-M", 18: "bot-R"
-    }
+    total = early_positions.sum()
+    rows = ["Positions early-game (turns 0-3):"]
+    for pos, count in top_positions(early_positions, 8):
+        pct = 100 * count / total
+        bar = _BARS[min(int(pct), 100)]
+        name = HEX_NAMES[pos] if 0 <= pos < NUM_POSITIONS else '?'
+        rows.append(f"  {pos:2d} ({name:7s}): {count:4d} ({pct:4.1f}%) {bar}")
+    sys.stdout.write("\n".join(rows) + "\n")
 
-    early_positions = defaultdict(int)
-    for gid, data in games.items():
-        for m in data['moves']:
-            if m['turn'] <= 3:
-                early_positions[m['pos']] += 1
+def compute_top_vs_bottom(scores, game_ids, moves):
+    """Compare top 50 vs bottom 50 games, or None if there are too few."""
+    if scores.size < 100:
+        return None
 
-    total = sum(early_positions.values())
-    print("Positions early-game (turns 0-3):")
-    sorted_pos = sorted(early_positions.items(), key=lambda x: -x[1])
-    for pos, count in sorted_pos[:8]:
-        pct = 100 * count / total
-        bar = "█" * int(pct)
-        print(f"  {pos:2d} ({hex_names.get(pos, '?'):7s}): {count:4d} ({pct:4.1f}%) {bar}")
+    top_idx = np.argpartition(-scores, 49)[:50]
+    bottom_idx = np.argpartition(scores, 49)[:50]
 
-def analyze_top_vs_bottom(games):
-    """Compare top vs bottom games."""
+    # First move analysis
+    def get_first_positions(idx):
+        first = moves.filter(
+            (pl.col('turn') == 0) & pl.col('game_id').is_in(game_ids[idx].tolist())
+        )
+        return count_positions(first)
+
+    return {
+        'top_avg': scores[top_idx].mean(),
+        'bottom_avg': scores[bottom_idx].mean(),
+        'top_pos': get_first_positions(top_idx),
+        'bottom_pos': get_first_positions(bottom_idx),
+    }
+
+def analyze_top_vs_bottom(result):
+    """Print the comparison computed by compute_top_vs_bottom."""
     print("\n📊 TOP 50 vs BOTTOM 50")
     print("-" * 50)
 
-    sorted_games = sorted(games.items(), key=lambda x: -x[1]['score'])
-
-    if len(sorted_games) < 100:
+    if result is None:
         print("Pas assez de données pour cette analyse")
         return
 
-    top_50 = sorted_games[:50]
-    bottom_50 = sorted_games[-50:]
-
-    top_avg = sum(d['score'] for _, d in top_50) / 50
-    bottom_avg = sum(d['score'] for _, d in bottom_50) / 50
-
+    top_avg, bottom_avg = result['top_avg'], result['bottom_avg']
     print(f"Score moyen TOP 50:    {top_avg:.1f} pts")
     print(f"Score moyen BOTTOM 50: {bottom_avg:.1f} pts")
     print(f"Écart:                 {top_avg - bottom_avg:.1f} pts")
 
-    # First move analysis
-    def get_first_positions(games_list):
-        pos = defaultdict(int)
-        for gid, data in games_list:
-            first = [m for m in data['moves'] if m['turn'] == 0]
-            for m in first:
-                pos[m['pos']] += 1
-        return pos
-
-    top_pos = get_first_positions(top_50)
-    bottom_pos = get_first_positions(bottom_50)
-
     print("\nPremier coup - TOP 50:")
-    for pos, count in sorted(top_pos.items(), key=lambda x: -x[1])[:3]:
+    for pos, count in top_positions(result['top_pos'], 3):
         print(f"  Position {pos}: {count}")
 
     print("\nPremier coup - BOTTOM 50:")
-    for pos, count in sorted(bottom_pos.items(), key=lambda x: -x[1])[:3]:
+    for pos, count in top_positions(result['bottom_pos'], 3):
         print(f"  Position {pos}: {count}")
 
 def suggest_improvements(mean, std, max_score):
@@ -193,31 +296,41 @@ def main():
     data_dir = Path("data")
 
     # Find latest training data
-    training_files = list(data_dir.glob("selfplay_*.csv"))
-    if not training_files:
-        training_files = list(data_dir.glob("*training*.csv"))
-
-    if training_files:
-        latest = max(training_files, key=lambda p: p.stat().st_mtime)
-        print(f"\nAnalyse de: {latest}")
-        games = load_training_data(latest)
-        all_scores = [d['score'] for d in games.values()]
-
-        mean, std = analyze_score_distribution(all_scores)
-        analyze_positions(games)
-        analyze_top_vs_bottom(games)
-        suggest_improvements(mean, std, max(all_scores))
-
-    # Arena results
+    latest = find_latest(data_dir, "selfplay_*.csv")
+    if latest is None:
+        latest = find_latest(data_dir, "*training*.csv")
+
     arena_file = data_dir / "arena_results.csv"
-    if arena_file.exists():
-        print("\n" + "=" * 60)
-        print("RÉSULTATS ARENA (comparaison modèles)")
-        print("=" * 60)
-        scores_a, scores_b = load_arena_results(arena_file)
-        if scores_a and scores_b:
-            print(f"\nModel A: {statistics.mean(scores_a):.1f} ± {statistics.stdev(scores_a):.1f}")
-            print(f"Model B: {statistics.mean(scores_b):.1f} ± {statistics.stdev(scores_b):.1f}")
+
+    # The analyses below are independent; NumPy and Polars release the GIL
+    # in their kernels, so they run concurrently and are printed in order.
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        arena = None
+        if arena_file.exists():
+            arena = executor.submit(load_arena_results, arena_file)
+
+        if latest is not None:
+            print(f"\nAnalyse de: {latest}")
+            moves, scores, game_ids = load_training_data(latest)
+
+            distribution = executor.submit(compute_score_distribution, scores)
+            positions = executor.submit(compute_positions, moves)
+            top_vs_bottom = executor.submit(compute_top_vs_bottom, scores, game_ids, moves)
+
+            mean, std = analyze_score_distribution(distribution.result())
+            analyze_positions(positions.result())
+            analyze_top_vs_bottom(top_vs_bottom.result())
+            suggest_improvements(mean, std, int(scores.max()))
+
+        # Arena results
+        if arena is not None:
+            print("\n" + "=" * 60)
+            print("RÉSULTATS ARENA (comparaison modèles)")
+            print("=" * 60)
+            scores_a, scores_b = arena.result()
+            if scores_a.size > 1 and scores_b.size > 1:
+                print(f"\nModel A: {scores_a.mean():.1f} ± {scores_a.std(ddof=1):.1f}")
+                print(f"Model B: {scores_b.mean():.1f} ± {scores_b.std(ddof=1):.1f}")
 
 if __name__ == "__main__":
     main()